@@ -4,42 +4,538 @@ catalog_service.py
 This module implements the Catalog Service for Bazar.com, an online bookstore.
 It handles search, info, and update operations on the book catalog.
 It also includes a background thread that periodically restocks items.
+Whenever the catalog changes, the service tells the Frontend Service to
+drop its cached copies of the affected entries.
 """
 
-from flask import Flask, jsonify, request
+import asyncio
+import atexit
+from flask import Flask, request
+import httpx
+import itertools
+import orjson
+import os
+import queue
 import sqlite3
-from database import init_db
+from database import init_db, snapshot_to_disk, MEMORY_DB_URI
 import threading
 import time
 import logging
+import logging.handlers
 
 app = Flask(__name__)
-DATABASE = 'catalog.db'
 
-# Create a lock object to ensure thread safety during database operations
-db_lock = threading.Lock()
+# Route all log records through a queue drained by a background listener,
+# so emitting a record never does stream I/O on a request thread. Hot
+# paths log at DEBUG with %-style arguments, which costs nothing while
+# the level is INFO.
+_log_queue = queue.Queue(-1)
+logging.getLogger().addHandler(logging.handlers.QueueHandler(_log_queue))
+logging.getLogger().setLevel(logging.INFO)
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+logger = logging.getLogger(__name__)
+
+def jout(obj, status=200):
+    """
+    Serializes a response body with orjson instead of Flask's jsonify.
+
+    orjson's C-level encoder is several times faster than the stdlib json
+    module on the list-of-dicts payloads /search returns, which matters
+    once the database itself is cached.
+
+    Parameters:
+        obj: The object to serialize.
+        status (int): The HTTP status code for the response.
+
+    Returns:
+        Response: A JSON response with the serialized body.
+    """
+    return app.response_class(orjson.dumps(obj), status=status, mimetype='application/json')
+
+# Every frontend instance keeps its own cache, so invalidations fan out
+# to all of them (comma-separated). The singular variable is still
+# honoured for single-gateway deployments.
+FRONTEND_SERVICE_URLS = tuple(url for url in os.environ.get(
+    'FRONTEND_SERVICE_URLS',
+    os.environ.get('FRONTEND_SERVICE_URL', 'http://frontend_service:5000')).split(',') if url)
+
+# Replication settings. REPLICA_URLS lists every catalog instance
+# (comma-separated); CURRENT_REPLICA_URL identifies this one so it can be
+# skipped when fanning out writes.
+CURRENT_REPLICA_URL = os.environ.get('CURRENT_REPLICA_URL', '')
+REPLICA_URLS = os.environ.get('REPLICA_URLS', '').split(',')
+# Peers to propagate writes to, filtered once at import so the fan-out
+# loop doesn't re-check emptiness and self-exclusion on every write.
+PEER_URLS = tuple(url for url in REPLICA_URLS if url and url != CURRENT_REPLICA_URL)
+
+# Replication bookkeeping: every propagated payload carries a sequence
+# number and its origin, so replicas can drop replayed or re-ordered
+# messages without touching the database.
+_seq = itertools.count()
+_last_seq = {}
+
+# Micro-batching of incoming replica writes. Rows arriving within the
+# batch window are applied with one executemany under a single commit,
+# so a burst of N replica_update calls costs one WAL sync instead of N.
+BATCH_WINDOW_SECONDS = 0.005
+BATCH_MAX_ROWS = 64
+_batch_cv = threading.Condition()
+_batch_rows = []
+_batch_gen = 0
+_batch_done = -1
+# Generations whose flush failed, so waiting handlers can report the
+# error instead of acknowledging rows that were never written. Pruned by
+# the flusher once the waiters have had a chance to see them.
+_batch_errors = {}
+
+# Hot-path SQL defined once at module level. Passing the same string
+# object to execute() every time guarantees hits in the connection's
+# compiled-statement cache, so reads become a bind-and-step only.
+SQL_SEARCH = 'SELECT id, title FROM books WHERE topic=?'
+SQL_INFO = 'SELECT title, quantity, price FROM books WHERE id=?'
+SQL_UPD_COMBO = 'UPDATE books SET quantity=COALESCE(?,quantity), price=COALESCE(?,price) WHERE id=?'
+SQL_DECREMENT = 'UPDATE books SET quantity = quantity - 1 WHERE id=? AND quantity > 0'
+SQL_RESTOCK = 'UPDATE books SET quantity = quantity + ?'
+
+# How many copies of each book a restock adds, and how often.
+RESTOCK_AMOUNT = 5
+RESTOCK_INTERVAL_SECONDS = 60
+
+# How often the in-memory database is snapshotted to disk for restart
+# safety. Losing up to a minute of stock counters is acceptable - the
+# restock thread regenerates quantity anyway.
+SNAPSHOT_INTERVAL_SECONDS = 60
+
+# Set to stop the restock thread; lets it exit promptly on shutdown
+# instead of being killed mid-sleep.
+_stop = threading.Event()
+
+def stop_restock():
+    """
+    Signals the restock and snapshot threads to exit at their next wakeup.
+    """
+    _stop.set()
+
+atexit.register(stop_restock)
+
+# Process-local read cache for /search and /info. Entries are keyed by
+# (kind, argument, version); every write bumps the version and clears the
+# dict, so stale entries can never be served. This is a pure L1 in front
+# of SQLite - the frontend keeps its own cache with its own invalidation.
+# The keys include caller-supplied arguments (topics, id lists), so the
+# dict is capped: once it reaches CACHE_MAX_ENTRIES it is cleared and
+# repopulated by subsequent reads, which bounds memory during write-free
+# windows without the bookkeeping of a true LRU.
+CACHE_MAX_ENTRIES = 1024
+_cache = {}
+_cache_version = 0
+_cache_lock = threading.Lock()
+
+def invalidate_local_cache():
+    """
+    Clears the process-local read cache and bumps its version counter.
+
+    Called by every write path (update, replica_update, restock) so that
+    subsequent reads fall through to SQLite and repopulate fresh entries.
+    """
+    global _cache_version
+    with _cache_lock:
+        _cache_version += 1
+        _cache.clear()
+
+def _cache_put(key, value):
+    """
+    Inserts a read result into the process-local cache.
+
+    The insert is dropped if the key's version no longer matches the
+    current cache version - a write landed while the query ran, so the
+    value may already be stale and would otherwise sit in the dict until
+    the next clear. When the cache is full it is cleared wholesale before
+    inserting, keeping its size bounded even when no writes arrive.
+
+    Parameters:
+        key (tuple): Cache key of the form (kind, argument, version).
+        value: The serialized body or result dict to store.
+    """
+    with _cache_lock:
+        if key[2] != _cache_version:
+            return
+        if len(_cache) >= CACHE_MAX_ENTRIES:
+            _cache.clear()
+        _cache[key] = value
+
+# All outbound HTTP (replica fan-out and cache invalidation) goes through
+# one httpx.AsyncClient on a dedicated event loop thread. With HTTP/2 the
+# client multiplexes concurrent POSTs to the same peer over a single
+# connection, so a fan-out costs one round-trip and no per-call TCP setup.
+_loop = asyncio.new_event_loop()
+threading.Thread(target=_loop.run_forever, daemon=True).start()
+_aclient = httpx.AsyncClient(http2=True, timeout=httpx.Timeout(2.0, connect=1.0))
+
+# Per-destination circuit breaker. After BREAKER_FAIL_THRESHOLD
+# consecutive failures a destination is skipped for BREAKER_OPEN_SECONDS,
+# so a dead replica or frontend bounds tail latency instead of making
+# every propagation wait out its timeout.
+BREAKER_FAIL_THRESHOLD = 5
+BREAKER_OPEN_SECONDS = 30
+_breaker = {}
+
+async def _post(url, payload=None, breaker_key=None):
+    """
+    POSTs a JSON payload through the shared async client.
+
+    Consecutive failures open a circuit for the destination and further
+    calls are skipped until it times out. Errors are logged and swallowed;
+    outbound calls must never take down the caller.
+
+    Parameters:
+        url (str): The URL to POST to.
+        payload (dict): The JSON body, or None for an empty POST.
+        breaker_key (str): Key grouping URLs that share a destination for
+                           circuit-breaking purposes; defaults to the URL.
+    """
+    entry = _breaker.setdefault(breaker_key or url, {'fails': 0, 'open_until': 0.0})
+    if time.monotonic() < entry['open_until']:
+        return
+    try:
+        await _aclient.post(url, json=payload)
+        entry['fails'] = 0
+    except httpx.HTTPError as e:
+        entry['fails'] += 1
+        if entry['fails'] >= BREAKER_FAIL_THRESHOLD:
+            entry['open_until'] = time.monotonic() + BREAKER_OPEN_SECONDS
+            logger.info("Circuit opened for %s for %ds", breaker_key or url, BREAKER_OPEN_SECONDS)
+        logger.info("Outbound POST to %s failed: %s", url, e)
+
+async def _post_many(urls, payload, breaker_keys=None):
+    """
+    POSTs the same payload to several URLs concurrently.
+
+    Parameters:
+        urls (tuple): The URLs to POST to.
+        payload (dict): The JSON body sent to each.
+        breaker_keys (tuple): Circuit-breaker key for each URL, typically
+                              the destination's base URL so failures on
+                              different paths of one dead host accumulate
+                              in a single breaker entry. Defaults to the
+                              full URLs.
+    """
+    if breaker_keys is None:
+        breaker_keys = urls
+    await asyncio.gather(*[_post(url, payload, breaker_key=key)
+                           for url, key in zip(urls, breaker_keys)])
+
+def _run_async(coro, timeout=5, wait=True):
+    """
+    Schedules a coroutine on the outbound event loop.
+
+    Parameters:
+        coro: The coroutine to run.
+        timeout (int): Seconds to wait before giving up on the result.
+        wait (bool): If False, fire and forget - the caller returns as
+                     soon as the coroutine is scheduled. Used by the
+                     restock thread so network I/O never delays its tick.
+    """
+    try:
+        future = asyncio.run_coroutine_threadsafe(coro, _loop)
+        if wait:
+            future.result(timeout=timeout)
+    except Exception as e:
+        logger.info("Outbound HTTP task failed: %s", e)
+
+# Bounded queue of deferred network tasks (cache invalidations and replica
+# propagation). A single daemon worker drains it, so /update can return as
+# soon as its local commit finishes while still preserving per-item
+# ordering of the outbound calls.
+_propagation_queue = queue.Queue(maxsize=10000)
+
+def _propagation_worker():
+    """
+    Drains the propagation queue, running one deferred task at a time.
+
+    Each task is a zero-argument callable enqueued by a write handler.
+    Exceptions are logged and swallowed so one failed call never kills
+    the worker thread.
+    """
+    while True:
+        task = _propagation_queue.get()
+        try:
+            task()
+        except Exception as e:
+            logger.info("Error in propagation task: %s", e)
+        finally:
+            _propagation_queue.task_done()
+
+threading.Thread(target=_propagation_worker, daemon=True).start()
+
+def queue_replica_write(quantity, price, item_id):
+    """
+    Adds one replica write to the current micro-batch and waits for the
+    batch that contains it to be committed.
+
+    Parameters:
+        quantity (int): New quantity, or None to keep the current value.
+        price (float): New price, or None to keep the current value.
+        item_id (int): The ID of the book to update.
+
+    Raises:
+        sqlite3.Error: If the batch containing this row failed to commit;
+                       the caller must not acknowledge the write.
+    """
+    with _batch_cv:
+        _batch_rows.append((quantity, price, item_id))
+        my_gen = _batch_gen
+        _batch_cv.notify_all()
+        while _batch_done < my_gen:
+            _batch_cv.wait()
+        error = _batch_errors.get(my_gen)
+    if error is not None:
+        raise error
+
+def _batch_flusher():
+    """
+    Drains the replica write micro-batch.
+
+    Waits for the first row of a batch, leaves the window open briefly so
+    closely-spaced writes can join (unless the batch is already full),
+    then applies all rows with one executemany under a single commit and
+    wakes the waiting handlers. A failed flush is recorded against its
+    generation so every waiter raises instead of acknowledging rows that
+    never reached the database.
+    """
+    global _batch_rows, _batch_gen, _batch_done
+    while True:
+        with _batch_cv:
+            while not _batch_rows:
+                _batch_cv.wait()
+            if len(_batch_rows) < BATCH_MAX_ROWS:
+                _batch_cv.wait(BATCH_WINDOW_SECONDS)
+            rows = _batch_rows
+            _batch_rows = []
+            gen = _batch_gen
+            _batch_gen += 1
+        error = None
+        try:
+            conn = get_conn()
+            _begin_write(conn)
+            try:
+                conn.executemany(SQL_UPD_COMBO, rows)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            invalidate_local_cache()
+        except Exception as e:
+            logger.info("Error flushing replica write batch: %s", e)
+            error = e
+        with _batch_cv:
+            if error is not None:
+                _batch_errors[gen] = error
+            # Waiters for older generations have all been woken already;
+            # keep only a short tail of failed generations around.
+            for old in [g for g in _batch_errors if g < gen - BATCH_MAX_ROWS]:
+                del _batch_errors[old]
+            _batch_done = gen
+            _batch_cv.notify_all()
+
+threading.Thread(target=_batch_flusher, daemon=True).start()
+
+# Thread-local storage so each worker thread keeps one long-lived connection
+# instead of paying the connect/close cost on every request.
+_local = threading.local()
+
+def get_conn():
+    """
+    Returns a per-thread persistent connection to the catalog database.
+
+    The connection is created lazily on the first call from each thread
+    and cached on a thread-local. All connections open the same shared
+    in-memory database (see database.MEMORY_DB_URI), so every query hits
+    RAM-resident pages with no file I/O; the file-oriented PRAGMAs the
+    on-disk setup needed (WAL, mmap, page-cache sizing) are moot here.
+
+    Shared-cache locking differs from WAL: conflicts raise SQLITE_LOCKED
+    immediately and the busy handler never runs. Two measures make the
+    old WAL-era concurrency hold anyway:
+        - read_uncommitted=1: readers take no table read locks, so they
+          neither fail while a write transaction is open nor block a
+          writer while a streaming cursor is held across socket writes.
+          Dirty reads are a non-issue here - writes are single UPDATE
+          statements, never multi-statement states a reader must not see.
+        - writer-vs-writer conflicts surface at BEGIN IMMEDIATE and are
+          retried by _begin_write below.
+
+    Returns:
+        sqlite3.Connection: The calling thread's cached connection.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        # isolation_level=None puts the connection in autocommit mode and
+        # disables sqlite3's implicit transaction management; write paths
+        # issue explicit BEGIN IMMEDIATE/COMMIT instead, taking the write
+        # lock up front and grouping their statements under one commit.
+        conn = sqlite3.connect(MEMORY_DB_URI, uri=True, cached_statements=256,
+                               isolation_level=None)
+        conn.execute('PRAGMA read_uncommitted=1')
+        _local.conn = conn
+    return conn
+
+def _begin_write(cursor):
+    """
+    Opens a write transaction, retrying shared-cache lock conflicts.
+
+    Two concurrent writers on a shared-cache database make the second
+    BEGIN IMMEDIATE fail with SQLITE_LOCKED right away (busy_timeout only
+    covers SQLITE_BUSY), so the conflict is absorbed here with a short
+    exponential backoff instead of surfacing as a 500.
+
+    Parameters:
+        cursor: The cursor to open the transaction on.
+    """
+    for attempt in range(5):
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            return
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            time.sleep(0.005 * 2 ** attempt)
+    cursor.execute('BEGIN IMMEDIATE')
+
+def send_cache_invalidate(item_id):
+    """
+    Tells every frontend instance to drop its cached entry for one book.
+
+    Used by the /update path, where only one item changes. Failures are
+    logged but otherwise ignored so a frontend outage never blocks writes.
+
+    Parameters:
+        item_id (int): The ID of the book whose cache entry should be dropped.
+    """
+    _run_async(_post_many(
+        tuple(f"{url}/invalidate/{item_id}" for url in FRONTEND_SERVICE_URLS), None,
+        breaker_keys=FRONTEND_SERVICE_URLS))
+
+def send_cache_invalidate_batch(item_ids=None, invalidate_all=False, wait=True):
+    """
+    Tells every frontend instance to drop many cached entries in one call.
+
+    Issues a single POST to each frontend's /invalidate_batch instead of
+    one request per item, so a full-catalog restock costs one round-trip
+    per gateway rather than N.
+
+    Parameters:
+        item_ids (list): IDs of books whose cache entries should be dropped.
+        invalidate_all (bool): If True, ask the frontends to flush their
+                               whole cache instead of listing individual IDs.
+        wait (bool): If False, the broadcast is fired without waiting for
+                     the responses.
+    """
+    payload = {'all': True} if invalidate_all else {'item_ids': item_ids or []}
+    _run_async(_post_many(
+        tuple(f"{url}/invalidate_batch" for url in FRONTEND_SERVICE_URLS), payload,
+        breaker_keys=FRONTEND_SERVICE_URLS),
+        wait=wait)
+
+def propagate_update(data):
+    """
+    Forwards a write to every other catalog replica concurrently.
+
+    POSTs the payload to each peer's /replica_update endpoint, gathered on
+    the shared async client so all peers are written concurrently over
+    multiplexed HTTP/2 streams. The caller waits for roughly one
+    round-trip instead of the sum over all replicas. Failures are logged
+    but do not fail the originating write.
+
+    Parameters:
+        data (dict): The payload to replicate (item_id plus changed fields).
+    """
+    if not PEER_URLS:
+        return
+    data = dict(data, seq=next(_seq), origin=CURRENT_REPLICA_URL)
+    _run_async(_post_many(tuple(f"{url}/replica_update" for url in PEER_URLS), data,
+                          breaker_keys=PEER_URLS))
 
 def restock_items():
     """
     Background thread function that periodically increases the quantity of each book.
 
-    This function runs in an infinite loop, sleeping for a specified interval (default is 60 seconds),
-    and then increments the quantity of all books in the catalog by 5.
-    It uses a threading lock to ensure thread safety during database operations.
+    This function loops until stop_restock() is called, waking every
+    RESTOCK_INTERVAL_SECONDS and incrementing the quantity of all books in
+    the catalog by RESTOCK_AMOUNT. The wait time is corrected for how long
+    the previous tick took, so the cadence doesn't drift, and waiting on
+    the stop event (instead of time.sleep) lets the thread exit promptly
+    on shutdown. SQLite's own locking (WAL plus busy_timeout) serializes
+    the write against concurrent updates.
     """
-    while True:
-        time.sleep(60)  # Restock every 60 seconds
-        with db_lock:
+    next_wait = RESTOCK_INTERVAL_SECONDS
+    while not _stop.wait(next_wait):
+        started = time.monotonic()
+        # The single UPDATE is atomic on its own; WAL plus busy_timeout
+        # serialize it against concurrent /update writers without an
+        # application-level mutex, and readers proceed throughout.
+        try:
+            conn = get_conn()
+            # Increase the quantity of each book by 5. One statement
+            # covers the whole catalog; there is no need to list the
+            # affected IDs since the invalidation below flushes
+            # everything anyway.
+            _begin_write(conn)
             try:
-                conn = sqlite3.connect(DATABASE)
-                cursor = conn.cursor()
-                # Increase the quantity of each book by 5
-                cursor.execute('UPDATE books SET quantity = quantity + 5')
-                conn.commit()
-                conn.close()
-                logging.info("Stock updated: Each item's quantity increased by 5.")
-            except Exception as e:
-                logging.info(f"Error in restocking items: {e}")
+                conn.execute(SQL_RESTOCK, (RESTOCK_AMOUNT,))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except Exception as e:
+            logger.info("Error in restocking items: %s", e)
+            next_wait = max(0.0, RESTOCK_INTERVAL_SECONDS - (time.monotonic() - started))
+            continue
+        logger.info("Stock updated: Each item's quantity increased by %d.", RESTOCK_AMOUNT)
+        invalidate_local_cache()
+        # Every item changed, so flush each frontend's cache with one
+        # batched call rather than posting one invalidation per book.
+        # Fire-and-forget: the broadcast runs on the outbound event loop
+        # and never delays the restock cadence.
+        send_cache_invalidate_batch(invalidate_all=True, wait=False)
+        # Subtract the time this tick took so the interval stays fixed.
+        next_wait = max(0.0, RESTOCK_INTERVAL_SECONDS - (time.monotonic() - started))
+
+def snapshot_catalog():
+    """
+    Background thread function that periodically dumps the in-memory
+    database to disk.
+
+    Loops until stop_restock() is called, writing a snapshot every
+    SNAPSHOT_INTERVAL_SECONDS with the online backup API (readers and
+    writers are not blocked). A final snapshot runs at process exit so a
+    clean shutdown loses nothing.
+    """
+    while not _stop.wait(SNAPSHOT_INTERVAL_SECONDS):
+        try:
+            snapshot_to_disk()
+            logger.debug("Catalog snapshot written to disk.")
+        except Exception as e:
+            logger.info("Error snapshotting catalog to disk: %s", e)
+
+def _final_snapshot():
+    """
+    Writes one last snapshot when the process exits.
+    """
+    try:
+        snapshot_to_disk()
+    except Exception as e:
+        logger.info("Error writing final catalog snapshot: %s", e)
+
+atexit.register(_final_snapshot)
+
+@app.route('/health', methods=['GET'])
+def health():
+    """
+    Liveness probe for the frontend's load balancer.
+    """
+    return jout({'status': 'ok'})
 
 @app.route('/search/<topic>', methods=['GET'])
 def search(topic):
@@ -54,12 +550,31 @@ def search(topic):
     Returns:
         Response: A JSON response containing a list of books with their IDs and titles.
     """
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, title FROM books WHERE topic=?', (topic,))
-    books = [{'id': row[0], 'title': row[1]} for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(books)
+    key = ('s', topic, _cache_version)
+    cached = _cache.get(key)
+    if cached is not None:
+        return app.response_class(cached, mimetype='application/json')
+    cursor = get_conn().cursor()
+    cursor.execute(SQL_SEARCH, (topic,))
+
+    def generate():
+        # Stream straight off the cursor so no intermediate list of rows
+        # is materialized and the socket write overlaps the fetch. The
+        # emitted chunks are collected so the serialized body can be
+        # cached for subsequent hits.
+        chunks = [b'[']
+        yield b'['
+        first = True
+        for row in cursor:
+            chunk = (b'' if first else b',') + orjson.dumps({'id': row[0], 'title': row[1]})
+            first = False
+            chunks.append(chunk)
+            yield chunk
+        chunks.append(b']')
+        yield b']'
+        _cache_put(key, b''.join(chunks))
+
+    return app.response_class(generate(), mimetype='application/json')
 
 @app.route('/info/<int:item_id>', methods=['GET'])
 def info(item_id):
@@ -75,15 +590,51 @@ def info(item_id):
         Response: A JSON response containing the book's details,
                   or an error message with a 404 status code if not found.
     """
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT title, quantity, price FROM books WHERE id=?', (item_id,))
+    key = ('i', item_id, _cache_version)
+    cached = _cache.get(key)
+    if cached is not None:
+        return jout(cached)
+    cursor = get_conn().cursor()
+    cursor.execute(SQL_INFO, (item_id,))
     row = cursor.fetchone()
-    conn.close()
     if row:
-        return jsonify({'title': row[0], 'quantity': row[1], 'price': row[2]})
+        item = {'title': row[0], 'quantity': row[1], 'price': row[2]}
+        _cache_put(key, item)
+        return jout(item)
     else:
-        return jsonify({'error': 'Item not found'}), 404
+        return jout({'error': 'Item not found'}, status=404)
+
+@app.route('/info_batch', methods=['GET'])
+def info_batch():
+    """
+    Handles GET requests to /info_batch?ids=1,2,3.
+
+    Looks up several books in one query, so a client that just searched a
+    topic can fetch details for every hit with a single round-trip and a
+    single SQLite statement instead of one /info call per book.
+
+    Returns:
+        Response: A JSON object mapping each found ID to its details.
+                  Unknown IDs are simply absent from the result.
+    """
+    try:
+        item_ids = tuple(int(part) for part in request.args.get('ids', '').split(',') if part)
+    except ValueError:
+        return jout({'error': 'ids must be a comma-separated list of integers'}, status=400)
+    if not item_ids:
+        return jout({})
+    key = ('b', item_ids, _cache_version)
+    cached = _cache.get(key)
+    if cached is not None:
+        return jout(cached)
+    cursor = get_conn().cursor()
+    placeholders = ','.join('?' * len(item_ids))
+    cursor.execute(f'SELECT id, title, quantity, price FROM books WHERE id IN ({placeholders})',
+                   item_ids)
+    items = {str(row[0]): {'title': row[1], 'quantity': row[2], 'price': row[3]}
+             for row in cursor.fetchall()}
+    _cache_put(key, items)
+    return jout(items)
 
 @app.route('/update/<int:item_id>', methods=['PUT'])
 def update(item_id):
@@ -100,19 +651,142 @@ def update(item_id):
     Returns:
         Response: A JSON response indicating the result of the operation.
     """
-    data = request.get_json()
-    conn = sqlite3.connect(DATABASE)
+    # Parse the body with orjson directly; the payloads are tiny dicts
+    # with known keys, so skipping Werkzeug's get_json() shim is cheaper.
+    try:
+        data = orjson.loads(request.get_data(cache=False) or b'{}')
+    except orjson.JSONDecodeError:
+        return jout({'error': 'Malformed JSON payload'}, status=400)
+    quantity = data.get('quantity')
+    price = data.get('price')
+    if quantity is None and price is None:
+        return jout({'message': 'Nothing to update'})
+    conn = get_conn()
     cursor = conn.cursor()
-    if 'quantity' in data:
-        cursor.execute('UPDATE books SET quantity=? WHERE id=?', (data['quantity'], item_id))
-    if 'price' in data:
-        cursor.execute('UPDATE books SET price=? WHERE id=?', (data['price'], item_id))
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Item updated'})
+    # COALESCE keeps the untouched column as-is, so one statement covers
+    # quantity-only, price-only and combined updates with a single row
+    # write. BEGIN IMMEDIATE takes the write lock up front rather than on
+    # the first write, so the statement never has to upgrade mid-flight.
+    _begin_write(cursor)
+    try:
+        cursor.execute(SQL_UPD_COMBO, (quantity, price, item_id))
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    invalidate_local_cache()
+    # Defer the network work to the propagation worker so the client only
+    # waits for the local commit, not for the frontend and every replica.
+    data_to_propagate = {'item_id': item_id,
+                         'quantity': quantity,
+                         'price': price}
+    _propagation_queue.put(lambda: send_cache_invalidate(item_id))
+    _propagation_queue.put(lambda: propagate_update(data_to_propagate))
+    return jout({'message': 'Item updated'})
+
+@app.route('/decrement/<int:item_id>', methods=['POST'])
+def decrement(item_id):
+    """
+    Handles POST requests to /decrement/<item_id>.
+
+    Atomically sells one copy of a book: the quantity is decremented by a
+    single guarded UPDATE, so two concurrent purchases of the last copy
+    can never both succeed. This replaces the order service's old
+    GET /info + PUT /update pair - one round-trip instead of two, and no
+    read-then-write race between them.
+
+    Parameters:
+        item_id (int): The ID of the book to sell.
+
+    Returns:
+        Response: The book's title and remaining quantity on success,
+                  404 if the book does not exist, or 409 if it is out
+                  of stock.
+    """
+    conn = get_conn()
+    cursor = conn.cursor()
+    _begin_write(cursor)
+    try:
+        cursor.execute(SQL_DECREMENT, (item_id,))
+        sold = cursor.rowcount > 0
+        cursor.execute(SQL_INFO, (item_id,))
+        row = cursor.fetchone()
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    if row is None:
+        return jout({'error': 'Item not found'}, status=404)
+    if not sold:
+        return jout({'error': 'Item out of stock'}, status=409)
+    invalidate_local_cache()
+    data_to_propagate = {'item_id': item_id, 'quantity': row[1], 'price': None}
+    _propagation_queue.put(lambda: send_cache_invalidate(item_id))
+    _propagation_queue.put(lambda: propagate_update(data_to_propagate))
+    return jout({'title': row[0], 'quantity': row[1]})
+
+@app.route('/replica_update', methods=['PUT', 'POST'])
+def replica_update():
+    """
+    Handles replication traffic from peer catalog instances.
+
+    Applies a write that originated on another replica to the local
+    database without propagating it further (which would cause a loop)
+    and without re-invalidating the frontend cache (the origin did that).
+
+    Expects a JSON payload with 'item_id' and 'quantity' and/or 'price',
+    or {'restock': True} for a catalog-wide restock broadcast.
+
+    Returns:
+        Response: A JSON response indicating the result of the operation.
+    """
+    # Parse the body with orjson directly; the payloads are tiny dicts
+    # with known keys, so skipping Werkzeug's get_json() shim is cheaper.
+    try:
+        data = orjson.loads(request.get_data(cache=False) or b'{}')
+    except orjson.JSONDecodeError:
+        return jout({'error': 'Malformed JSON payload'}, status=400)
+    # Drop duplicates and stale replays before doing any database work.
+    seq = data.get('seq')
+    origin = data.get('origin')
+    if seq is not None:
+        if seq <= _last_seq.get(origin, -1):
+            return jout({'message': 'Duplicate update ignored'})
+        _last_seq[origin] = seq
+    if data.get('restock'):
+        # Applied on the per-thread pooled connection with the cached
+        # restock statement - no connection open/close per broadcast.
+        conn = get_conn()
+        _begin_write(conn)
+        try:
+            conn.execute(SQL_RESTOCK, (RESTOCK_AMOUNT,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        invalidate_local_cache()
+        return jout({'message': 'Restock applied'})
+    item_id = data.get('item_id')
+    quantity = data.get('quantity')
+    price = data.get('price')
+    if quantity is None and price is None:
+        return jout({'message': 'Nothing to update'})
+    # Hand the row to the micro-batch; the call returns once the batch
+    # containing it has been committed, so the 200 still means durable -
+    # a failed flush raises instead and is reported as a 500 so the
+    # origin never mistakes a dropped row for an applied one.
+    try:
+        queue_replica_write(quantity, price, item_id)
+    except sqlite3.Error as e:
+        logger.info("Replica write failed: %s", e)
+        return jout({'error': 'Replica write failed'}, status=500)
+    return jout({'message': 'Replica updated'})
 
 if __name__ == '__main__':
+    # Local debugging only - production serving goes through wsgi.py
+    # under gunicorn (see the Dockerfile CMD).
     init_db()
-    # Start the restocking thread
+    # Start the restocking and snapshot threads
     threading.Thread(target=restock_items, daemon=True).start()
+    threading.Thread(target=snapshot_catalog, daemon=True).start()
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -1,19 +1,37 @@
 """
 database.py
 
-This module provides a function to initialize the catalog database for Bazar.com.
-It creates the 'books' table if it doesn't exist and seeds it with initial data.
+This module manages the catalog database for Bazar.com.
+
+The live database is an in-memory SQLite instance shared between all
+threads of the process (a named shared-cache URI), so every query works
+on RAM-resident B-tree pages with no file I/O at all. Durability comes
+from periodic snapshots: the in-memory database is dumped to 'catalog.db'
+with SQLite's online backup API, and on startup the latest snapshot is
+restored if one exists.
 """
 
 import sqlite3
 
+# Named shared-cache in-memory database: every connection opening this
+# URI sees the same data, which is what lets the per-thread pooled
+# connections in app.py share one catalog.
+MEMORY_DB_URI = 'file:catalog_mem?mode=memory&cache=shared'
+# On-disk snapshot target, also the restore source after a restart.
+DISK_DATABASE = 'catalog.db'
+
+# A shared-cache in-memory database is destroyed when its last connection
+# closes, so one connection is kept open for the life of the process.
+_keepalive = None
+
 def init_db():
     """
-    Initializes the catalog database.
+    Initializes the in-memory catalog database.
 
-    - Connects to the 'catalog.db' SQLite database.
-    - Creates the 'books' table if it doesn't exist.
-    - Seeds initial data into the 'books' table if it's empty.
+    - Opens (and keeps open) the shared in-memory database.
+    - If an on-disk snapshot with catalog data exists, restores it.
+    - Otherwise creates the 'books' table, its indexes, and the seed
+      data, then writes an initial snapshot to disk.
 
     The 'books' table has the following schema:
         - id (INTEGER PRIMARY KEY): Unique identifier for each book.
@@ -24,8 +42,20 @@ def init_db():
 
     Initial data seeded includes four books with predefined details.
     """
-    conn = sqlite3.connect('catalog.db')
-    cursor = conn.cursor()
+    global _keepalive
+    _keepalive = sqlite3.connect(MEMORY_DB_URI, uri=True, check_same_thread=False)
+    disk = sqlite3.connect(DISK_DATABASE)
+    has_books = disk.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='books'").fetchone()
+    if has_books:
+        # backup() replaces the whole target database, so the restore
+        # happens before any schema work on the in-memory side.
+        disk.backup(_keepalive)
+        disk.close()
+        print("Database restored from on-disk snapshot.")
+        return
+    disk.close()
+    cursor = _keepalive.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS books (
             id INTEGER PRIMARY KEY,
@@ -35,16 +65,32 @@ def init_db():
             price REAL
         )
     ''')
-    # Seed initial data if table is empty
-    cursor.execute('SELECT COUNT(*) FROM books')
-    if cursor.fetchone()[0] == 0:
-        books = [
-            (1, 'How to get a good grade in DOS in 40 minutes a day', 'distributed systems', 10, 50.0),
-            (2, 'RPCs for Noobs', 'distributed systems', 10, 25.0),
-            (3, 'Xen and the Art of Surviving Undergraduate School', 'undergraduate school', 10, 75.0),
-            (4, 'Cooking for the Impatient Undergrad', 'undergraduate school', 10, 100.0),
-        ]
-        cursor.executemany('INSERT INTO books VALUES (?, ?, ?, ?, ?)', books)
-        conn.commit()
-        print("Database initialized with default books.")
-    conn.close()
+    # Index the topic column so /search does an index seek instead of a
+    # full table scan. The covering index lets SQLite answer the
+    # SELECT id, title ... WHERE topic=? query from the index alone.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_topic ON books(topic)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_books_topic_cover ON books(topic, id, title)')
+    books = [
+        (1, 'How to get a good grade in DOS in 40 minutes a day', 'distributed systems', 10, 50.0),
+        (2, 'RPCs for Noobs', 'distributed systems', 10, 25.0),
+        (3, 'Xen and the Art of Surviving Undergraduate School', 'undergraduate school', 10, 75.0),
+        (4, 'Cooking for the Impatient Undergrad', 'undergraduate school', 10, 100.0),
+    ]
+    cursor.executemany('INSERT INTO books VALUES (?, ?, ?, ?, ?)', books)
+    _keepalive.commit()
+    snapshot_to_disk()
+    print("Database initialized with default books.")
+
+def snapshot_to_disk():
+    """
+    Dumps the in-memory catalog to the on-disk snapshot file.
+
+    Uses SQLite's online backup API, so readers and writers on the
+    in-memory database proceed while the copy runs. Called periodically
+    by the snapshot thread in app.py and once at process exit.
+    """
+    disk = sqlite3.connect(DISK_DATABASE)
+    try:
+        _keepalive.backup(disk)
+    finally:
+        disk.close()
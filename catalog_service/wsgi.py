@@ -0,0 +1,20 @@
+"""
+wsgi.py
+
+Gunicorn entry point for the Catalog Service.
+
+Initializes the in-memory database and starts the background restocking
+and snapshot threads once at import time, then exposes the Flask
+application object for the WSGI server. Serving through gunicorn's
+threaded workers lets /search and /info run concurrently, which the
+Flask development server cannot do.
+"""
+
+import threading
+
+from app import app, restock_items, snapshot_catalog
+from database import init_db
+
+init_db()
+threading.Thread(target=restock_items, daemon=True).start()
+threading.Thread(target=snapshot_catalog, daemon=True).start()
@@ -6,20 +6,407 @@ It acts as an API Gateway that proxies client requests to the appropriate backen
 - Catalog Service: Handles book catalog operations.
 - Order Service: Handles purchase and order retrieval operations.
 
+It also keeps an in-memory LRU cache of catalog responses, which the backend
+services invalidate through the /invalidate endpoints whenever the catalog
+changes.
+
 Endpoints provided by this service:
+- /invalidate/<item_id> : Invalidate the cached info entry for one book.
+- /invalidate_batch     : Invalidate many cached entries (or all) in one call.
 - /search/<topic>     : Search for books by topic.
 - /info/<item_id>     : Get detailed information about a specific book.
+- /info_batch         : Get details for several books in one call.
 - /purchase/<item_id> : Purchase a book by its ID.
 - /orders             : Retrieve all orders placed.
 """
 #noor
-from flask import Flask, jsonify
+from concurrent.futures import Future
+from flask import Flask, request
+import orjson
+import os
+import queue
+import random
 import requests
+import threading
+import time
+from requests.adapters import HTTPAdapter
+import logging
+import logging.handlers
 
 app = Flask(__name__)
 
-CATALOG_SERVICE_URL = 'http://catalog_service:5001'
-ORDER_SERVICE_URL = 'http://order_service:5002'
+# Route all log records through a queue drained by a background listener,
+# so emitting a record never does stream I/O on a request greenlet. Hot
+# paths log at DEBUG with %-style arguments, which costs nothing while
+# the level is INFO.
+_log_queue = queue.Queue(-1)
+logging.getLogger().addHandler(logging.handlers.QueueHandler(_log_queue))
+logging.getLogger().setLevel(logging.INFO)
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+logger = logging.getLogger(__name__)
+
+def jout(obj, status=200):
+    """
+    Serializes a response body with orjson instead of Flask's jsonify.
+
+    The gateway returns small JSON payloads at high rates, so the C-level
+    encoder noticeably cuts per-request serialization cost.
+
+    Parameters:
+        obj: The object to serialize.
+        status (int): The HTTP status code for the response.
+
+    Returns:
+        Response: A JSON response with the serialized body.
+    """
+    return app.response_class(orjson.dumps(obj), status=status, mimetype='application/json')
+
+def jraw(body, status=200):
+    """
+    Wraps already-serialized JSON bytes in a response without re-encoding.
+
+    The proxy routes used to parse each backend payload and immediately
+    re-serialize the identical data; passing the raw bytes through skips
+    both passes.
+
+    Parameters:
+        body (bytes): The serialized JSON payload.
+        status (int): The HTTP status code for the response.
+
+    Returns:
+        Response: A JSON response carrying the bytes unchanged.
+    """
+    return app.response_class(body, status=status, mimetype='application/json')
+
+def _parse_urls(name, default):
+    """
+    Parses a comma-separated URL list from the environment exactly once.
+
+    Whitespace and empty segments (e.g. a trailing comma) are dropped, so
+    downstream code never has to re-check for '' entries on the hot path.
+
+    Parameters:
+        name (str): The environment variable to read.
+        default (str): The value used when the variable is unset.
+
+    Returns:
+        tuple: The cleaned base URLs.
+    """
+    return tuple(url.strip() for url in os.environ.get(name, default).split(',') if url.strip())
+
+# Backend replicas, comma-separated in the environment. Single-instance
+# deployments keep working with the defaults.
+CATALOG_SERVICE_URLS = _parse_urls('CATALOG_SERVICE_URLS', 'http://catalog_service:5001')
+ORDER_SERVICE_URLS = _parse_urls('ORDER_SERVICE_URLS', 'http://order_service:5002')
+HEALTH_PROBE_INTERVAL_SECONDS = 5
+
+# One pooled session for all backend calls. Keep-alive connections to the
+# catalog and order services are reused across requests, so each proxied
+# call skips the TCP handshake it used to pay.
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=0))
+REQUEST_TIMEOUT = 5
+
+class BackendPool:
+    """
+    A set of interchangeable backend replicas with health-aware balancing.
+
+    Rather than bare round-robin (which keeps sending 1/N of the traffic
+    to a slow or dead replica), each dispatch samples two healthy replicas
+    and picks the one with fewer requests in flight - the classic
+    power-of-two-choices scheme, which tracks load nearly as well as a
+    global shortest-queue without any coordination. A background probe
+    marks replicas unhealthy so they stop receiving traffic at all until
+    they recover.
+    """
+
+    def __init__(self, urls):
+        # urls comes pre-cleaned from _parse_urls, so no re-filtering here.
+        self.urls = tuple(urls)
+        self.inflight = {url: 0 for url in self.urls}
+        self.healthy = set(self.urls)
+        self.lock = threading.Lock()
+
+    def pick(self):
+        """
+        Chooses a replica URL for one request.
+
+        Returns:
+            str: The base URL of the chosen replica.
+        """
+        with self.lock:
+            candidates = [u for u in self.urls if u in self.healthy] or list(self.urls)
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = random.sample(candidates, 2)
+        return first if self.inflight[first] <= self.inflight[second] else second
+
+    def request(self, method, path, **kwargs):
+        """
+        Sends one request to the pool, tracking in-flight counts.
+
+        Parameters:
+            method (str): The HTTP method.
+            path (str): The path to append to the chosen replica's URL.
+
+        Returns:
+            Response: The backend's response.
+        """
+        url = self.pick()
+        self.inflight[url] += 1
+        try:
+            return SESSION.request(method, url + path, timeout=REQUEST_TIMEOUT, **kwargs)
+        finally:
+            self.inflight[url] -= 1
+
+    def probe(self):
+        """
+        Checks every replica's /health endpoint once and updates the
+        healthy set accordingly.
+        """
+        for url in self.urls:
+            try:
+                ok = SESSION.get(url + '/health', timeout=2).status_code == 200
+            except requests.exceptions.RequestException:
+                ok = False
+            with self.lock:
+                if ok:
+                    if url not in self.healthy:
+                        logger.info("Backend %s is healthy again", url)
+                    self.healthy.add(url)
+                elif url in self.healthy:
+                    logger.info("Backend %s failed its health probe; removed from rotation", url)
+                    self.healthy.discard(url)
+
+CATALOG_POOL = BackendPool(CATALOG_SERVICE_URLS)
+ORDER_POOL = BackendPool(ORDER_SERVICE_URLS)
+
+def _health_prober():
+    """
+    Periodically probes every backend replica so dead ones are taken out
+    of rotation within a few seconds.
+    """
+    while True:
+        time.sleep(HEALTH_PROBE_INTERVAL_SECONDS)
+        CATALOG_POOL.probe()
+        ORDER_POOL.probe()
+
+threading.Thread(target=_health_prober, daemon=True).start()
+
+# In-memory cache for catalog responses.
+# Keys are 'search:<topic>' and 'info:<item_id>'; values are the serialized
+# JSON payloads (raw bytes) returned by the Catalog Service. Entries are dropped when the backend tells
+# us an item changed, or when the cache grows past CACHE_SIZE.
+class SieveShard:
+    """
+    A small SIEVE cache shard.
+
+    Unlike an LRU, a cache hit only flips a per-entry visited flag - it
+    never splices a recency list - so the read path is a plain dict lookup
+    that is safe without a lock under the GIL. Only inserts, deletes and
+    eviction mutate the structure, and those take the shard lock. Eviction
+    sweeps a hand over the entries, clearing visited flags as it passes
+    and removing the first entry it finds unvisited.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self._data = {}  # key -> [value, visited]
+        self._hand = None
+
+    def get(self, key):
+        """
+        Returns the cached value for a key, or None. Marks the entry as
+        visited so the eviction sweep spares it; no lock is taken.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        entry[1] = True
+        return entry[0]
+
+    def set(self, key, value):
+        """
+        Stores a value, evicting one unvisited entry if the shard is full.
+        """
+        with self.lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                entry[0] = value
+                entry[1] = True
+                return
+            if len(self._data) >= self.maxsize:
+                self._evict()
+            self._data[key] = [value, False]
+
+    def pop(self, key):
+        """
+        Removes a key if present.
+        """
+        with self.lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """
+        Empties the shard.
+        """
+        with self.lock:
+            self._data.clear()
+            self._hand = None
+
+    def _evict(self):
+        """
+        Removes one entry, starting the sweep where the hand last stopped.
+        Visited entries get their flag cleared and are passed over, so the
+        sweep always terminates at an unvisited entry.
+        """
+        keys = list(self._data)
+        if not keys:
+            return
+        i = keys.index(self._hand) if self._hand in self._data else 0
+        n = len(keys)
+        while True:
+            key = keys[i % n]
+            entry = self._data[key]
+            if entry[1]:
+                entry[1] = False
+                i += 1
+            else:
+                self._hand = keys[(i + 1) % n] if n > 1 else None
+                del self._data[key]
+                return
+
+# The cache is sharded by key hash so writers only contend when they
+# touch the same shard; reads are wait-free everywhere.
+CACHE_SIZE = 100
+N_SHARDS = 16
+_shards = tuple(SieveShard(maxsize=max(1, CACHE_SIZE // N_SHARDS))
+                for _ in range(N_SHARDS))
+
+# Keys of currently cached search entries, tracked separately so
+# invalidation drops them directly instead of scanning every shard for
+# keys with the 'search:' prefix.
+_search_keys = set()
+_search_keys_lock = threading.Lock()
+
+def _shard(key):
+    """
+    Returns the shard responsible for a key.
+
+    Parameters:
+        key (str): The cache key.
+    """
+    return _shards[hash(key) & (N_SHARDS - 1)]
+
+def cache_get(key):
+    """
+    Looks up a key in the cache; a hit marks the entry as visited.
+
+    Parameters:
+        key (str): The cache key to look up.
+
+    Returns:
+        The cached value, or None if the key is not cached.
+    """
+    return _shard(key).get(key)
+
+def cache_set(key, value):
+    """
+    Stores a value in the cache, evicting an unvisited entry of the
+    key's shard if that shard is full.
+
+    Parameters:
+        key (str): The cache key.
+        value: The JSON payload to cache.
+    """
+    _shard(key).set(key, value)
+    if key.startswith('search:'):
+        with _search_keys_lock:
+            _search_keys.add(key)
+
+def cache_pop(key):
+    """
+    Removes a key from the cache if present.
+
+    Parameters:
+        key (str): The cache key to remove.
+    """
+    _shard(key).pop(key)
+
+def cache_clear():
+    """
+    Empties every shard of the cache.
+    """
+    for shard in _shards:
+        shard.clear()
+    with _search_keys_lock:
+        _search_keys.clear()
+
+def drop_search_entries():
+    """
+    Removes every cached search result.
+
+    Search payloads can reference any item, so any catalog change makes
+    them suspect; they are dropped wholesale on invalidation. The keys
+    come from the dedicated search-key set, so this touches only the
+    entries that actually exist instead of scanning the whole cache.
+    """
+    with _search_keys_lock:
+        keys = list(_search_keys)
+        _search_keys.clear()
+    for key in keys:
+        cache_pop(key)
+
+# In-flight coalescing map for /info misses: item_id -> Future holding
+# (body, status). Only the first requester of a missing item hits the
+# catalog; followers wait on the leader's future.
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+@app.route('/invalidate/<int:item_id>', methods=['POST'])
+def invalidate(item_id):
+    """
+    Handles POST requests to /invalidate/<item_id>.
+
+    Drops the cached info entry for the given book, along with all cached
+    search results (quantities and prices shown there may be stale).
+
+    Parameters:
+        item_id (int): The ID of the book whose cache entries to drop.
+
+    Returns:
+        Response: A JSON response confirming the invalidation.
+    """
+    cache_pop(f'info:{item_id}')
+    drop_search_entries()
+    return jout({'message': f'Invalidated item {item_id}'})
+
+@app.route('/invalidate_batch', methods=['POST'])
+def invalidate_batch():
+    """
+    Handles POST requests to /invalidate_batch.
+
+    Invalidates many cache entries in a single call, so backends like the
+    catalog restock job don't have to issue one HTTP request per book.
+
+    Expects a JSON payload with either:
+        - 'all' (bool): If true, the entire cache is flushed.
+        - 'item_ids' (list): IDs of books whose entries should be dropped.
+
+    Returns:
+        Response: A JSON response confirming the invalidation.
+    """
+    data = request.get_json()
+    if data.get('all'):
+        cache_clear()
+        return jout({'message': 'Cache flushed'})
+    item_ids = data.get('item_ids', [])
+    for item_id in item_ids:
+        cache_pop(f'info:{item_id}')
+    drop_search_entries()
+    return jout({'message': f'Invalidated {len(item_ids)} items'})
 
 @app.route('/search/<topic>', methods=['GET'])
 def search(topic):
@@ -34,8 +421,15 @@ def search(topic):
     Returns:
         Response: A JSON response containing a list of books matching the topic.
     """
-    response = requests.get(f"{CATALOG_SERVICE_URL}/search/{topic}")
-    return jsonify(response.json())
+    cache_key = f'search:{topic}'
+    cached = cache_get(cache_key)
+    if cached is not None:
+        return jraw(cached)
+    logger.debug("search cache miss: %s", topic)
+    response = CATALOG_POOL.request('GET', f"/search/{topic}")
+    if response.status_code == 200:
+        cache_set(cache_key, response.content)
+    return jraw(response.content, status=response.status_code)
 
 @app.route('/info/<int:item_id>', methods=['GET'])
 def info(item_id):
@@ -50,8 +444,72 @@ def info(item_id):
     Returns:
         Response: A JSON response containing the book's details.
     """
-    response = requests.get(f"{CATALOG_SERVICE_URL}/info/{item_id}")
-    return jsonify(response.json())
+    cache_key = f'info:{item_id}'
+    cached = cache_get(cache_key)
+    if cached is not None:
+        return jraw(cached)
+    logger.debug("info cache miss: %d", item_id)
+    # Coalesce concurrent misses for the same item: the first requester
+    # becomes the leader and issues the backend call, everyone else waits
+    # on its future. A burst of requests for a hot book that was just
+    # invalidated costs the catalog one lookup instead of one per caller.
+    with _inflight_lock:
+        future = _inflight.get(item_id)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[item_id] = future
+    if not leader:
+        body, status = future.result(timeout=REQUEST_TIMEOUT)
+        return jraw(body, status=status)
+    try:
+        response = CATALOG_POOL.request('GET', f"/info/{item_id}")
+        if response.status_code == 200:
+            cache_set(cache_key, response.content)
+        future.set_result((response.content, response.status_code))
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(item_id, None)
+    return jraw(response.content, status=response.status_code)
+
+@app.route('/info_batch', methods=['GET'])
+def info_batch():
+    """
+    Handles GET requests to /info_batch?ids=1,2,3.
+
+    Fetches details for several books at once. Cached entries are served
+    locally; all missing IDs are fetched from the Catalog Service in one
+    batched backend call rather than one /info round-trip per book.
+
+    Returns:
+        Response: A JSON object mapping each found ID to its details.
+    """
+    try:
+        item_ids = [int(part) for part in request.args.get('ids', '').split(',') if part]
+    except ValueError:
+        return jout({'error': 'ids must be a comma-separated list of integers'}, status=400)
+    result = {}
+    missing = []
+    for item_id in item_ids:
+        cached = cache_get(f'info:{item_id}')
+        if cached is not None:
+            # Cached entries are serialized bytes; orjson splices them into
+            # the output verbatim instead of decoding and re-encoding them.
+            result[str(item_id)] = orjson.Fragment(cached)
+        else:
+            missing.append(item_id)
+    if missing:
+        ids_param = ','.join(str(item_id) for item_id in missing)
+        response = CATALOG_POOL.request('GET', f"/info_batch?ids={ids_param}")
+        if response.status_code == 200:
+            fetched = response.json()
+            for item_id, item in fetched.items():
+                cache_set(f'info:{item_id}', orjson.dumps(item))
+                result[item_id] = item
+    return jout(result)
 
 @app.route('/purchase/<int:item_id>', methods=['PUT'])
 def purchase(item_id):
@@ -66,8 +524,8 @@ def purchase(item_id):
     Returns:
         Response: A JSON response indicating the result of the purchase operation.
     """
-    response = requests.put(f"{ORDER_SERVICE_URL}/purchase/{item_id}")
-    return jsonify(response.json())
+    response = ORDER_POOL.request('PUT', f"/purchase/{item_id}")
+    return jraw(response.content, status=response.status_code)
 
 @app.route('/orders', methods=['GET'])
 def get_all_orders():
@@ -79,8 +537,10 @@ def get_all_orders():
     Returns:
         Response: A JSON response containing a list of all orders and the corresponding status code.
     """
-    response = requests.get(f"{ORDER_SERVICE_URL}/orders")
-    return jsonify(response.json()), response.status_code
+    response = ORDER_POOL.request('GET', "/orders")
+    return jraw(response.content, status=response.status_code)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Local debugging only - production serving goes through wsgi.py
+    # under gunicorn (see the Dockerfile CMD).
+    app.run(host='0.0.0.0', port=5000)
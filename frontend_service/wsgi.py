@@ -0,0 +1,13 @@
+"""
+wsgi.py
+
+Gunicorn entry point for the Frontend Service.
+
+The gateway is almost entirely I/O-bound: each request spends its time
+waiting on a backend HTTP call. Serving it with gunicorn's gevent worker
+(which monkey-patches the socket layer) lets hundreds of proxied calls be
+in flight at once on a single process, which the Flask development server
+cannot do.
+"""
+
+from app import app  # noqa: F401
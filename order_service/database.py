@@ -8,7 +8,8 @@ The 'orders' table schema:
 - order_id (INTEGER PRIMARY KEY AUTOINCREMENT): Unique identifier for each order.
 - item_id (INTEGER): The ID of the item purchased.
 - quantity (INTEGER): The quantity of the item purchased.
-- timestamp (TEXT): The date and time when the order was placed.
+- timestamp (INTEGER): When the order was placed, in nanoseconds since
+  the epoch (rendered as ISO text by the /orders endpoint).
 
 Environment Variables:
 - DATABASE: Specifies the filename for the orders database. Defaults to 'orders.db' if not set.
@@ -25,7 +26,7 @@ def init_db():
         - order_id: Auto-incrementing primary key.
         - item_id: ID of the purchased item.
         - quantity: Quantity purchased.
-        - timestamp: Timestamp of the purchase.
+        - timestamp: Purchase time in nanoseconds since the epoch.
     - Closes the database connection after setup.
 
     Prints:
@@ -33,14 +34,24 @@ def init_db():
     """
     conn = sqlite3.connect('orders.db')
     cursor = conn.cursor()
+    # journal_mode=WAL is persistent, so setting it here guarantees the
+    # database file is already in WAL mode before the first request;
+    # synchronous and busy_timeout are per-connection and are reapplied
+    # by the app's connection factory.
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA busy_timeout=5000')
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS orders (
             order_id INTEGER PRIMARY KEY AUTOINCREMENT,
             item_id INTEGER,
             quantity INTEGER,
-            timestamp TEXT
+            timestamp INTEGER
         )
     ''')
+    # Index item_id for per-item order lookups; the order log is
+    # append-only, so the index costs one extra B-tree insert per purchase.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_item ON orders(item_id)')
     conn.commit()
     conn.close()
     print("Orders database initialized.")
@@ -0,0 +1,15 @@
+"""
+wsgi.py
+
+Gunicorn entry point for the Order Service.
+
+Initializes the database once at import time, then exposes the Flask
+application object for the WSGI server. Serving through gunicorn's
+threaded workers lets purchases overlap their catalog round-trips, which
+the Flask development server cannot do.
+"""
+
+from app import app  # noqa: F401
+from database import init_db
+
+init_db()